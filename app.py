@@ -1,27 +1,151 @@
-import sys, os, ctypes, subprocess, shutil, time, json, psutil, tempfile
+import sys, os, ctypes, subprocess, shutil, time, json, psutil, tempfile, threading, functools, contextlib, argparse, queue, bisect, hashlib, math
+from collections import deque
 from ctypes import wintypes
 from PySide6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QPushButton,
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QListWidget, QFileDialog, QSystemTrayIcon, QMenu,
-    QMessageBox, QStyle, QLabel, QCheckBox, QStatusBar
+    QMessageBox, QStyle, QLabel, QCheckBox, QStatusBar,
+    QLineEdit, QComboBox
 )
 from PySide6.QtGui import QIcon, QAction, QPixmap, QFont
-from PySide6.QtCore import Qt, QSettings, QTimer
+from PySide6.QtCore import Qt, QSettings, QTimer, QObject, Signal
 
 # Directory to store wallpaper videos
 VIDEO_DIR = os.path.join(os.getcwd(), "Wallpapers")
 os.makedirs(VIDEO_DIR, exist_ok=True)
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.webm')
+LIBRARY_INDEX_FILE = os.path.join(VIDEO_DIR, ".library_index.json")  # Persisted wallpaper metadata
+PREVIEW_DIR = os.path.join(VIDEO_DIR, ".previews")  # Cached preview sprite sheets
+PREVIEW_CACHE_BUDGET = 256 * 1024 ** 2  # Disk budget for preview sheets, in bytes
+PREVIEW_FPS = 6
+PREVIEW_COLUMNS = 6
+PREVIEW_ROWS = 6  # 36 frames, the first 6 seconds at PREVIEW_FPS
+PREVIEW_HEIGHT = 144  # Frame height, fits the 150 px preview pane
+PREVIEW_PRIORITY_BACKGROUND = 2  # Library-wide prefetch, only while the cache is under budget
 
 current_process = None  # Wallpaper process
-preview_process = None  # Preview process
+preview_player = None  # Preview widget currently animating
 is_muted = True
 is_looping = True
 mpv_socket = None  # MPV IPC socket path
 last_mute_state = None  # Track last mute state
 pending_mute = None  # Track pending mute state
 audio_control_enabled = True  # Flag for audio control
+mpv_events = None  # Persistent MPV IPC event listener
+launch_metrics = {}  # Latency of the last wallpaper launch stages, in milliseconds
+wallpaper_hwnd = None  # Desktop window the wallpaper is embedded in
+wallpaper_supervisor = None  # Restarts the wallpaper after crashes
+wallpaper_library = None  # Indexed wallpaper metadata
+preview_cache = None  # Background preview sheet generator
+FIRST_FRAME_TIMEOUT = 15.0  # Seconds to wait for the first wallpaper frame
 temp_log_file = os.path.join(tempfile.gettempdir(), "mpv_debug.log")  # Temporary MPV log file
+trace_enabled = False  # Flag for span tracing
+trace_events = deque(maxlen=200000)  # Recorded Chrome trace events
+trace_file = os.path.join(tempfile.gettempdir(), "live_wallpaper_trace.json")  # Default trace output
 
+class TraceSpan:
+    """
+    Context manager recording one Chrome trace "complete" event.
+    """
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "cat": "live_wallpaper",
+            "ph": "X",
+            "ts": self.start / 1000,
+            "dur": (end - self.start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident()
+        }
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        if self.args:
+            event["args"] = self.args
+        trace_events.append(event)
+        return False
+
+_null_span = contextlib.nullcontext()
+
+def trace_span(name, **args):
+    """
+    Return a span for the named phase, or a shared no-op context when tracing is disabled.
+    """
+    if not trace_enabled:
+        return _null_span
+    return TraceSpan(name, args)
+
+def traced(name):
+    """
+    Decorator wrapping a whole function call in a trace span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not trace_enabled:
+                return func(*args, **kwargs)
+            with TraceSpan(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_instant(name, **args):
+    """
+    Record a point-in-time trace event.
+    """
+    if not trace_enabled:
+        return
+    trace_events.append({
+        "name": name,
+        "cat": "live_wallpaper",
+        "ph": "i",
+        "s": "p",
+        "ts": time.perf_counter_ns() / 1000,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "args": args
+    })
+
+def trace_counter(name, **values):
+    """
+    Record numeric values as a trace counter track.
+    """
+    if not trace_enabled:
+        return
+    trace_events.append({
+        "name": name,
+        "cat": "live_wallpaper",
+        "ph": "C",
+        "ts": time.perf_counter_ns() / 1000,
+        "pid": os.getpid(),
+        "args": values
+    })
+
+def dump_trace(path=None):
+    """
+    Write recorded trace events as Chrome trace / Perfetto JSON and return the file path.
+    """
+    path = path or trace_file
+    pid = os.getpid()
+    metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "Live Wallpaper"}}]
+    for thread in threading.enumerate():
+        metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread.ident, "args": {"name": thread.name}})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": metadata + list(trace_events), "displayTimeUnit": "ms"}, f)
+    print(f"[INFO] Wrote {len(trace_events)} trace events to {path}")
+    return path
+
+@traced("terminate_lingering_mpv")
 def terminate_lingering_mpv():
     """
     Terminate any lingering MPV processes to avoid socket conflicts.
@@ -38,6 +162,7 @@ def terminate_lingering_mpv():
                 print(f"[WARNING] MPV process {proc.pid} did not terminate gracefully, killing")
                 proc.kill()
 
+@traced("check_pipe_availability")
 def check_pipe_availability(pipe_name):
     """
     Check if the named pipe is available.
@@ -62,6 +187,110 @@ def check_pipe_availability(pipe_name):
         print(f"[DEBUG] Named pipe {pipe_name} not accessible: {e}")
         return False
 
+class MpvEventListener:
+    """
+    Persistent MPV IPC connection whose events are delivered to a queue by a reader thread.
+    """
+    def __init__(self, pipe_name):
+        self.pipe_name = pipe_name
+        self.events = queue.Queue()
+        self.disconnected = threading.Event()  # Set once the pipe closes, even if the sentinel event was consumed
+        self.handle = None
+        self.thread = None
+
+    def connect(self, commands=()):
+        """
+        Open the named pipe, send the initial commands and start reading events.
+        Raises if the pipe does not exist yet.
+        """
+        import win32file
+        from win32con import GENERIC_READ, GENERIC_WRITE, OPEN_EXISTING
+        self.handle = win32file.CreateFile(
+            self.pipe_name,
+            GENERIC_READ | GENERIC_WRITE,
+            0,
+            None,
+            OPEN_EXISTING,
+            0,
+            None
+        )
+        # Synchronous pipe I/O is serialized, so all writes happen before the reader starts
+        for request_id, command in commands:
+            cmd = json.dumps({"command": command, "request_id": request_id}) + "\n"
+            win32file.WriteFile(self.handle, cmd.encode('utf-8'))
+        self.thread = threading.Thread(target=self._read_loop, name="mpv-events", daemon=True)
+        self.thread.start()
+
+    def _read_loop(self):
+        import win32file
+        buffer = b""
+        try:
+            while True:
+                _, data = win32file.ReadFile(self.handle, 4096)
+                if not data:
+                    break
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    try:
+                        self.events.put(json.loads(line))
+                    except ValueError:
+                        print(f"[DEBUG] Ignoring malformed MPV IPC line: {line!r}")
+        except Exception as e:
+            print(f"[DEBUG] MPV event pipe {self.pipe_name} closed: {e}")
+        finally:
+            win32file.CloseHandle(self.handle)
+            self.disconnected.set()
+            self.events.put({"event": "ipc-disconnected"})
+
+def wait_for_first_frame(process, pipe_name, launch_start, timeout=FIRST_FRAME_TIMEOUT):
+    """
+    Connect to the MPV IPC server as soon as it exists and wait for the first rendered frame.
+    Returns (listener, stalled_stage); stalled_stage is None once a frame has been shown.
+    """
+    deadline = launch_start + timeout
+    listener = MpvEventListener(pipe_name)
+
+    # Stage 1: the IPC endpoint appears shortly after MPV starts, retry with millisecond backoff
+    delay = 0.002
+    with trace_span("wait_ipc_endpoint", pipe=pipe_name):
+        while True:
+            if process.poll() is not None:
+                return None, "process-exit"
+            try:
+                # vo-configured covers a frame that was shown before we connected
+                listener.connect([(1, ["get_property", "vo-configured"])])
+                break
+            except Exception:
+                pass
+            if time.perf_counter() + delay > deadline:
+                return None, "ipc-endpoint"
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+    launch_metrics["ipc_ready_ms"] = (time.perf_counter() - launch_start) * 1000
+
+    # Stage 2: video-reconfig, then playback-restart once the first frame is displayed
+    stage = "video-reconfig"
+    with trace_span("wait_first_frame", pipe=pipe_name):
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return listener, stage
+            try:
+                message = listener.events.get(timeout=remaining)
+            except queue.Empty:
+                return listener, stage
+            event = message.get("event")
+            if event == "ipc-disconnected":
+                return listener, "process-exit" if process.poll() is not None else stage
+            if event == "video-reconfig" and stage == "video-reconfig":
+                launch_metrics["video_reconfig_ms"] = (time.perf_counter() - launch_start) * 1000
+                stage = "playback-restart"
+            elif event == "playback-restart" or (message.get("request_id") == 1 and message.get("data") is True):
+                launch_metrics["first_frame_ms"] = (time.perf_counter() - launch_start) * 1000
+                return listener, None
+
+@traced("focus_check")
 def is_desktop_active():
     """
     Check if the desktop is currently active (no other apps in foreground).
@@ -94,6 +323,7 @@ def is_desktop_active():
     print(f"[DEBUG] Foreground window: {foreground_window}, Class: {class_str}, Title: {title_str}, Is Desktop: {is_desktop}")
     return is_desktop
 
+@traced("get_desktop_handle")
 def get_desktop_handle():
     """
     Retrieve the handle of the WorkerW window for the desktop wallpaper.
@@ -144,15 +374,18 @@ def stop_video(is_preview=False):
     """
     Stop the currently playing video (wallpaper or preview).
     """
-    global current_process, preview_process, mpv_socket, pending_mute, audio_control_enabled
-    if is_preview and preview_process:
+    global current_process, preview_player, mpv_socket, pending_mute, audio_control_enabled, mpv_events
+    if not is_preview and wallpaper_supervisor:
+        wallpaper_supervisor.disarm()  # Intentional stop, not a crash
+    if is_preview and preview_player:
         print("[INFO] Stopping preview video.")
-        preview_process.terminate()
-        preview_process = None
+        preview_player.stop()
+        preview_player = None
     elif not is_preview and current_process:
         print("[INFO] Stopping wallpaper video.")
         current_process.terminate()
         current_process = None
+        mpv_events = None  # Reader thread exits when MPV closes the pipe
         if mpv_socket and os.path.exists(mpv_socket):
             os.remove(mpv_socket)
             mpv_socket = None
@@ -192,19 +425,20 @@ def send_mpv_command(command, retries=5, delay=0.7):
 
     for attempt in range(retries):
         try:
-            handle = win32file.CreateFile(
-                mpv_socket,
-                GENERIC_READ | GENERIC_WRITE,
-                0,
-                None,
-                OPEN_EXISTING,
-                win32file.FILE_FLAG_OVERLAPPED,
-                None
-            )
-            cmd = json.dumps({"command": command}) + "\n"
-            win32file.WriteFile(handle, cmd.encode('utf-8'))
-            result, response = win32file.ReadFile(handle, 1024)
-            win32file.CloseHandle(handle)
+            with trace_span("mpv_ipc_round_trip", command=command, attempt=attempt + 1):
+                handle = win32file.CreateFile(
+                    mpv_socket,
+                    GENERIC_READ | GENERIC_WRITE,
+                    0,
+                    None,
+                    OPEN_EXISTING,
+                    win32file.FILE_FLAG_OVERLAPPED,
+                    None
+                )
+                cmd = json.dumps({"command": command}) + "\n"
+                win32file.WriteFile(handle, cmd.encode('utf-8'))
+                result, response = win32file.ReadFile(handle, 1024)
+                win32file.CloseHandle(handle)
             print(f"[INFO] Sent MPV command: {command}, Response: {response.decode('utf-8')}")
             return True
         except Exception as e:
@@ -212,11 +446,59 @@ def send_mpv_command(command, retries=5, delay=0.7):
             if attempt < retries - 1:
                 time.sleep(delay)
     
-    print(f"[ERROR] MPV socket {mpv_socket} unavailable after {retries} attempts")
+    print(f"[ERROR] MPV socket {mpv_socket} unavailable after {retries} attempts, audio control will be retried automatically")
     audio_control_enabled = False
-    QMessageBox.warning(None, "Warning", f"Failed to initialize MPV audio controls due to socket failure: {mpv_socket}. Try running as administrator, reinstalling MPV, or checking for conflicting software.")
     return False
 
+def query_mpv_property(pipe_name, name, timeout=1.0):
+    """
+    Read a property from MPV over a short-lived IPC connection, or None on failure or timeout.
+    The pipe is polled rather than read with a blocking ReadFile, so a hung MPV cannot stall the caller.
+    """
+    try:
+        import win32file
+        import win32pipe
+        from win32con import GENERIC_READ, GENERIC_WRITE, OPEN_EXISTING
+        handle = win32file.CreateFile(
+            pipe_name,
+            GENERIC_READ | GENERIC_WRITE,
+            0,
+            None,
+            OPEN_EXISTING,
+            0,
+            None
+        )
+    except Exception as e:
+        print(f"[DEBUG] Failed to open MPV pipe {pipe_name} to query {name}: {e}")
+        return None
+    try:
+        with trace_span("mpv_ipc_query", property=name):
+            cmd = json.dumps({"command": ["get_property", name], "request_id": 2}) + "\n"
+            win32file.WriteFile(handle, cmd.encode('utf-8'))
+            deadline = time.perf_counter() + timeout
+            buffer = b""
+            while time.perf_counter() < deadline:
+                _, available, _ = win32pipe.PeekNamedPipe(handle, 0)
+                if not available:
+                    time.sleep(0.01)
+                    continue
+                _, data = win32file.ReadFile(handle, available)
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    message = json.loads(line)
+                    # Skip events broadcast to this connection
+                    if message.get("request_id") == 2:
+                        return message.get("data") if message.get("error") == "success" else None
+            print(f"[WARNING] Timeout querying MPV property {name}")
+            return None
+    except Exception as e:
+        print(f"[DEBUG] Failed to query MPV property {name}: {e}")
+        return None
+    finally:
+        win32file.CloseHandle(handle)
+
+@traced("check_audio_track")
 def check_audio_track(video_path):
     """
     Check if the video has an audio track using ffprobe or MPV.
@@ -254,24 +536,67 @@ def check_audio_track(video_path):
         print(f"[ERROR] MPV failed to check audio track: {e}")
         return False
 
-def play_video_as_wallpaper(video_path, mute=True, loop=True):
+@traced("probe_video")
+def probe_video(video_path):
+    """
+    Read resolution, duration, codec and audio presence of a video with ffprobe.
+    Unknown values are None; returns None if ffprobe is missing or fails.
+    """
+    metadata = {"width": None, "height": None, "duration": None, "codec": None, "has_audio": None}
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-print_format", "json", video_path],
+            capture_output=True, text=True, timeout=10
+        )
+        if result.returncode != 0:
+            print(f"[WARNING] ffprobe failed for {video_path}: {result.stderr}")
+            return None
+        info = json.loads(result.stdout)
+    except FileNotFoundError:
+        print("[INFO] ffprobe not found, library metadata unavailable")
+        return None
+    except Exception as e:
+        print(f"[ERROR] ffprobe failed to probe {video_path}: {e}")
+        return None
+    streams = info.get("streams", [])
+    video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+    if video:
+        metadata["width"] = video.get("width")
+        metadata["height"] = video.get("height")
+        metadata["codec"] = (video.get("codec_name") or "").lower() or None
+    metadata["has_audio"] = any(stream.get("codec_type") == "audio" for stream in streams)
+    try:
+        metadata["duration"] = float(info.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        pass
+    return metadata
+
+@traced("launch_wallpaper")
+def play_video_as_wallpaper(video_path, mute=True, loop=True, start=None, interactive=True):
     """
     Play the specified video as the desktop wallpaper using MPV.
+    Automatic restarts pass the last playback position as start and skip dialogs with interactive=False.
     """
-    global current_process, mpv_socket, last_mute_state, pending_mute, audio_control_enabled
+    global current_process, mpv_socket, last_mute_state, pending_mute, audio_control_enabled, mpv_events, wallpaper_hwnd
     stop_video(is_preview=False)
     terminate_lingering_mpv()
+    launch_metrics.clear()
     
-    has_audio = check_audio_track(video_path)
-    if not has_audio:
-        print("[WARNING] Selected video may not have an audio track. Audio controls may not work.")
-        QMessageBox.warning(None, "Warning", "Selected video may not have an audio track. Try a different video for audio controls.")
+    if interactive:
+        entry = wallpaper_library.get(os.path.basename(video_path)) if wallpaper_library else None
+        has_audio = entry["has_audio"] if entry and entry["has_audio"] is not None else check_audio_track(video_path)
+        if not has_audio:
+            print("[WARNING] Selected video may not have an audio track. Audio controls may not work.")
+            QMessageBox.warning(None, "Warning", "Selected video may not have an audio track. Try a different video for audio controls.")
     
     hwnd = get_desktop_handle()
+    wallpaper_hwnd = hwnd
     if not hwnd:
         print("[ERROR] Failed to find a valid desktop handle.")
-        QMessageBox.critical(None, "Error", "❌ Failed to find desktop window.")
+        if interactive:
+            QMessageBox.critical(None, "Error", "❌ Failed to find desktop window.")
         return False
+    start_args = [f"--start={start:.3f}"] if start else []
 
     width = ctypes.windll.user32.GetSystemMetrics(0)
     height = ctypes.windll.user32.GetSystemMetrics(1)
@@ -292,42 +617,60 @@ def play_video_as_wallpaper(video_path, mute=True, loop=True):
             "--vo=gpu",
             "--profile=low-latency",
             f"--log-file={temp_log_file}",
+            *start_args,
             video_path
         ]
 
         print(f"[INFO] Wallpaper MPV Command: {' '.join(map(str, command))}")
         try:
-            current_process = subprocess.Popen(command, stderr=subprocess.PIPE, text=True)
-            # Wait for socket to be created
-            for _ in range(30):  # Try for up to 15 seconds
-                if check_pipe_availability(mpv_socket):
-                    print(f"[INFO] MPV socket {mpv_socket} created successfully")
-                    audio_control_enabled = True
-                    break
-                time.sleep(0.5)
-            else:
-                print(f"[ERROR] MPV socket {mpv_socket} not created after 15 seconds")
+            launch_start = time.perf_counter()
+            with trace_span("mpv_popen", socket=socket_name):
+                # MPV output goes to the log file; an unread stderr pipe could block it
+                current_process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+            listener, stalled_stage = wait_for_first_frame(current_process, mpv_socket, launch_start)
+            elapsed_ms = (time.perf_counter() - launch_start) * 1000
+            if listener is None:
+                print(f"[ERROR] MPV socket {mpv_socket} not available, stalled at stage '{stalled_stage}' after {elapsed_ms:.0f} ms")
+                current_process.terminate()
+                current_process = None
                 continue  # Try next socket name
-            
-            # Read initial MPV debug output
-            try:
-                _, stderr = current_process.communicate(timeout=15)
-                print(f"[ERROR] MPV stderr: {stderr}")
-            except subprocess.TimeoutExpired:
-                print("[ERROR] Timeout reading MPV stderr after 15 seconds")
+            if stalled_stage == "process-exit":
+                # IPC worked, so another socket name would not help
+                print(f"[ERROR] MPV exited {elapsed_ms:.0f} ms after launch, before rendering a frame")
+                current_process = None
+                if os.path.exists(temp_log_file):
+                    with open(temp_log_file, 'r', encoding='utf-8') as f:
+                        print(f"[DEBUG] MPV log file contents: {f.read()}")
+                if interactive:
+                    QMessageBox.critical(None, "Error", "❌ MPV exited before rendering the wallpaper. Check the MPV log or try a different video.")
+                return False
+            print(f"[INFO] MPV socket {mpv_socket} connected after {launch_metrics['ipc_ready_ms']:.0f} ms")
+            mpv_events = listener
+            audio_control_enabled = True
+            if stalled_stage:
+                print(f"[ERROR] No wallpaper frame after {elapsed_ms:.0f} ms, stalled at stage '{stalled_stage}'")
+                if interactive:
+                    QMessageBox.warning(None, "Warning", f"Wallpaper did not render a frame within {FIRST_FRAME_TIMEOUT:.0f} seconds (stalled at: {stalled_stage}).")
+            else:
+                print(f"[INFO] First wallpaper frame after {launch_metrics['first_frame_ms']:.0f} ms")
+            trace_counter("launch_latency_ms", **launch_metrics)
             
             # Read log file
-            if os.path.exists(temp_log_file):
-                with open(temp_log_file, 'r', encoding='utf-8') as f:
-                    print(f"[DEBUG] MPV log file contents: {f.read()}")
+            with trace_span("read_mpv_log"):
+                if os.path.exists(temp_log_file):
+                    with open(temp_log_file, 'r', encoding='utf-8') as f:
+                        print(f"[DEBUG] MPV log file contents: {f.read()}")
             
             last_mute_state = mute
             pending_mute = None
+            if wallpaper_supervisor:
+                wallpaper_supervisor.watch(current_process, listener, video_path)
             print("[INFO] Wallpaper MPV launched successfully.")
             return True
         except FileNotFoundError:
             print("[ERROR] MPV not found.")
-            QMessageBox.critical(None, "Error", "❌ MPV not found. Please install it and add to PATH.")
+            if interactive:
+                QMessageBox.critical(None, "Error", "❌ MPV not found. Please install it and add to PATH.")
             return False
     
     # All socket names failed
@@ -343,10 +686,12 @@ def play_video_as_wallpaper(video_path, mute=True, loop=True):
         "--vo=gpu",
         "--profile=low-latency",
         f"--log-file={temp_log_file}",
+        *start_args,
         video_path
     ]
     try:
-        current_process = subprocess.Popen(command, stderr=subprocess.PIPE, text=True)
+        with trace_span("mpv_popen", socket=None):
+            current_process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
         print("[INFO] Wallpaper MPV launched without IPC")
         # Read log file
         if os.path.exists(temp_log_file):
@@ -355,42 +700,797 @@ def play_video_as_wallpaper(video_path, mute=True, loop=True):
         audio_control_enabled = False
         last_mute_state = mute
         pending_mute = None
-        QMessageBox.warning(None, "Warning", "Failed to initialize MPV audio controls. Wallpaper will play without audio toggling. Try running as administrator or reinstalling MPV.")
+        if wallpaper_supervisor:
+            wallpaper_supervisor.watch(current_process, None, video_path)
+        if interactive:
+            QMessageBox.warning(None, "Warning", "Failed to initialize MPV audio controls. Wallpaper will play without audio toggling. Try running as administrator or reinstalling MPV.")
         return True
     except FileNotFoundError:
         print("[ERROR] MPV not found.")
-        QMessageBox.critical(None, "Error", "❌ MPV not found. Please install it and add to PATH.")
+        if interactive:
+            QMessageBox.critical(None, "Error", "❌ MPV not found. Please install it and add to PATH.")
         return False
 
-def play_preview_video(video_path, widget, mute=True, loop=True):
+def preview_sheet_path(video_path):
     """
-    Play the specified video in the preview widget using MPV.
+    Return the cache path of the preview sprite sheet for a video, keyed by name, size and mtime.
     """
-    global preview_process
-    stop_video(is_preview=True)
-    hwnd = widget.winId()
+    stat = os.stat(video_path)
+    key = f"{os.path.basename(video_path)}|{stat.st_size}|{stat.st_mtime}"
+    return os.path.join(PREVIEW_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".jpg")
+
+def preview_frame_count(video_path):
+    """
+    Number of real frames in a sprite sheet; short videos leave the rest of the grid empty.
+    """
+    entry = wallpaper_library.get(os.path.basename(video_path)) if wallpaper_library else None
+    if entry and entry["duration"]:
+        return max(1, min(PREVIEW_COLUMNS * PREVIEW_ROWS, math.ceil(entry["duration"] * PREVIEW_FPS)))
+    return PREVIEW_COLUMNS * PREVIEW_ROWS
+
+@traced("preview_generate")
+def generate_preview_sheet(video_path, sheet_path):
+    """
+    Render the first seconds of a video as a low-res, low-fps sprite sheet with ffmpeg.
+    Raises FileNotFoundError if ffmpeg is not installed.
+    """
+    temp_path = sheet_path + ".tmp.jpg"
     command = [
-        "mpv",
-        f"--wid={hwnd}",
-        "--loop" if loop else "--no-loop",
-        "--no-border",
-        f"--mute={'yes' if mute else 'no'}",
-        "--geometry=100%",
-        "--hwdec=dxva2",
-        "--vo=gpu",
-        "--profile=low-latency",
-        video_path
+        "ffmpeg",
+        "-v", "error",
+        "-y",
+        "-t", str(PREVIEW_COLUMNS * PREVIEW_ROWS / PREVIEW_FPS),
+        "-i", video_path,
+        "-an",
+        "-vf", f"fps={PREVIEW_FPS},scale=-2:{PREVIEW_HEIGHT},tile={PREVIEW_COLUMNS}x{PREVIEW_ROWS}",
+        "-frames:v", "1",
+        "-q:v", "5",
+        temp_path
     ]
-
-    print(f"[INFO] Preview MPV Command: {' '.join(map(str, command))}")
     try:
-        preview_process = subprocess.Popen(command)
-        print("[INFO] Preview MPV launched successfully.")
+        result = subprocess.run(command, capture_output=True, text=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        print(f"[ERROR] Timeout generating preview for {video_path}")
+        return False
+    if result.returncode != 0 or not os.path.exists(temp_path):
+        print(f"[ERROR] ffmpeg failed to generate preview for {video_path}: {result.stderr}")
+        return False
+    os.replace(temp_path, sheet_path)
+    print(f"[INFO] Generated preview {sheet_path}")
+    return True
+
+@traced("preview_evict")
+def evict_preview_cache(budget=PREVIEW_CACHE_BUDGET):
+    """
+    Delete least recently used preview sheets until the cache fits in the disk budget.
+    Returns the remaining cache size in bytes.
+    """
+    sheets = []
+    for item in os.scandir(PREVIEW_DIR):
+        if item.is_file() and item.name.endswith(".jpg"):
+            stat = item.stat()
+            sheets.append((stat.st_mtime, stat.st_size, item.path))
+    total = sum(size for _, size, _ in sheets)
+    for _, size, path in sorted(sheets):
+        if total <= budget:
+            break
+        try:
+            os.remove(path)
+            total -= size
+            print(f"[INFO] Evicted preview {path}")
+        except OSError as e:
+            print(f"[WARNING] Failed to evict preview {path}: {e}")
+    return total
+
+class PreviewCache(QObject):
+    """
+    Generate preview sprite sheets on a background thread, most urgent requests first.
+    """
+    ready = Signal(str, str)  # (video path, sheet path or "" on failure), emitted from the worker thread
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        self._queue = queue.PriorityQueue()
+        self._pending = {}  # Video path -> most urgent queued priority
+        self._failed = set()
+        self._ffmpeg_missing = False
+        self._sequence = 0
+        self._cache_size = evict_preview_cache()
+        self._sheet_size = 0  # Size of the last generated sheet, estimates the next one
+        self._thread = threading.Thread(target=self._work, name="preview-cache", daemon=True)
+        self._thread.start()
+
+    def request(self, video_path, priority=0):
+        """
+        Return the cached sheet path, or queue generation and return None.
+        Returns "" if no preview can be generated for the video.
+        Lower priority values are generated first.
+        """
+        try:
+            sheet_path = preview_sheet_path(video_path)
+        except OSError:
+            return None
+        if os.path.exists(sheet_path):
+            os.utime(sheet_path)  # Mark as recently used for eviction
+            return sheet_path
+        if self._ffmpeg_missing or video_path in self._failed:
+            return ""
+        self._enqueue(video_path, priority, sheet_path)
+        return None
+
+    def prefetch(self, video_paths):
+        """
+        Queue background generation for every video, stopping once the cache reaches its disk budget.
+        """
+        if self._ffmpeg_missing:
+            return
+        for video_path in video_paths:
+            self._enqueue(video_path, PREVIEW_PRIORITY_BACKGROUND, None)
+
+    def _enqueue(self, video_path, priority, sheet_path):
+        if video_path in self._failed or self._pending.get(video_path, priority + 1) <= priority:
+            return
+        # A more urgent request re-queues the video; the stale entry is skipped by the worker
+        self._pending[video_path] = priority
+        self._sequence += 1
+        self._queue.put((priority, self._sequence, video_path, sheet_path))
+
+    def _work(self):
+        while True:
+            priority, _, video_path, sheet_path = self._queue.get()
+            if self._pending.get(video_path) != priority:
+                continue
+            background = priority >= PREVIEW_PRIORITY_BACKGROUND
+            if self._ffmpeg_missing:
+                # Drain the queue without spawning a process per video
+                self._pending.pop(video_path, None)
+                if not background:
+                    self.ready.emit(video_path, "")
+                continue
+            try:
+                sheet_path = sheet_path or preview_sheet_path(video_path)
+            except OSError:
+                self._pending.pop(video_path, None)
+                continue
+            if os.path.exists(sheet_path):
+                # Nothing new to show; only a requested preview needs the signal
+                self._pending.pop(video_path, None)
+                if not background:
+                    self.ready.emit(video_path, sheet_path)
+                continue
+            if background and self._cache_size + self._sheet_size > PREVIEW_CACHE_BUDGET:
+                # Cache is full; only previews the user asks for may evict others
+                self._pending.pop(video_path, None)
+                continue
+            try:
+                generated = generate_preview_sheet(video_path, sheet_path)
+            except FileNotFoundError:
+                print("[INFO] ffmpeg not found, previews unavailable")
+                self._ffmpeg_missing = True
+                generated = False
+            if generated:
+                self._sheet_size = os.path.getsize(sheet_path)
+                self._cache_size = evict_preview_cache()
+            else:
+                self._failed.add(video_path)
+            self._pending.pop(video_path, None)
+            self.ready.emit(video_path, sheet_path if generated else "")
+
+class PreviewPlayer(QLabel):
+    """
+    Animate a preview sprite sheet in-process.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAlignment(Qt.AlignCenter)
+        self.sheet = None
+        self.sheet_path = None
+        self.frame = 0
+        self.frame_count = 0
+        self.loop = True
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000 // PREVIEW_FPS)
+        self.timer.timeout.connect(self._next_frame)
+
+    def play(self, sheet_path, frame_count, loop=True):
+        """
+        Start animating the given sprite sheet.
+        """
+        sheet = QPixmap(sheet_path)
+        if sheet.isNull():
+            print(f"[ERROR] Failed to load preview {sheet_path}")
+            self.show_message("Preview unavailable")
+            return False
+        self.sheet = sheet
+        self.sheet_path = sheet_path
+        self.frame_width = sheet.width() // PREVIEW_COLUMNS
+        self.frame_height = sheet.height() // PREVIEW_ROWS
+        self.frame = 0
+        self.frame_count = frame_count
+        self.loop = loop
+        self._show_frame()
+        self.timer.start()
         return True
-    except FileNotFoundError:
-        print("[ERROR] MPV not found for preview.")
-        QMessageBox.critical(None, "Error", "❌ MPV not found for preview. Please install it and add to PATH.")
+
+    def stop(self):
+        """
+        Stop the animation and clear the pane.
+        """
+        self.timer.stop()
+        self.sheet = None
+        self.sheet_path = None
+        self.clear()
+
+    def show_message(self, text):
+        """
+        Replace the animation with a text message.
+        """
+        self.stop()
+        self.setText(text)
+
+    def _show_frame(self):
+        column = self.frame % PREVIEW_COLUMNS
+        row = self.frame // PREVIEW_COLUMNS
+        self.setPixmap(self.sheet.copy(column * self.frame_width, row * self.frame_height, self.frame_width, self.frame_height))
+
+    def _next_frame(self):
+        if self.frame + 1 >= self.frame_count:
+            if not self.loop:
+                self.timer.stop()
+                return
+            self.frame = 0
+        else:
+            self.frame += 1
+        self._show_frame()
+
+@traced("preview_show")
+def play_preview_video(video_path, widget, loop=True):
+    """
+    Animate the cached preview of the specified video in the preview widget.
+    Returns False while the preview is still being generated or cannot be generated.
+    """
+    global preview_player
+    stop_video(is_preview=True)
+    sheet_path = preview_cache.request(video_path)
+    if sheet_path is None:
+        widget.show_message("Generating preview...")
+        return False
+    if not sheet_path:
+        widget.show_message("Preview unavailable")
         return False
+    if widget.play(sheet_path, preview_frame_count(video_path), loop=loop):
+        preview_player = widget
+        return True
+    return False
+
+class WallpaperSupervisor(QObject):
+    """
+    Watch the wallpaper MPV process and restart it after crashes or lost IPC.
+    """
+    failure = Signal(int, str)  # (launch generation, reason), emitted from watcher threads
+    recovered = Signal(float)  # Recovery time in milliseconds
+    gave_up = Signal(str)
+
+    RESTART_BASE_DELAY_MS = 250
+    RESTART_MAX_DELAY_MS = 8000
+    CRASH_LOOP_LIMIT = 5  # Failures within the window before giving up
+    CRASH_LOOP_WINDOW = 60.0
+    AUDIO_RETRY_MAX_DELAY = 30.0
+    POSITION_SAMPLE_INTERVAL = 2.0  # Seconds between restart position samples
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.generation = 0
+        self.video_path = None
+        self.position = None
+        self.crash_times = deque()
+        self.failure_started = None
+        self.last_recovery_ms = None
+        self.audio_retry_delay = 1.0
+        self.audio_retry_at = 0.0
+        self.waiting_for_desktop = False  # Explorer is restarting, retry once Progman is back
+        self.failure.connect(self._on_failure)
+        self.restart_timer = QTimer(self)
+        self.restart_timer.setSingleShot(True)
+        self.restart_timer.timeout.connect(self._restart)
+        self.health_timer = QTimer(self)
+        self.health_timer.timeout.connect(self._check_health)
+
+    def watch(self, process, listener, video_path):
+        """
+        Start watching a freshly launched wallpaper process.
+        """
+        self.generation += 1
+        self.video_path = video_path
+        threading.Thread(target=self._wait_process, args=(self.generation, process), name="mpv-supervisor", daemon=True).start()
+        if listener:
+            threading.Thread(target=self._wait_events, args=(self.generation, process, listener), name="mpv-supervisor-ipc", daemon=True).start()
+            threading.Thread(target=self._sample_position, args=(self.generation, process, mpv_socket), name="mpv-supervisor-position", daemon=True).start()
+        self.health_timer.start(1000)
+
+    def disarm(self):
+        """
+        Stop watching the current process; pending restarts are cancelled.
+        """
+        self.generation += 1
+        self.waiting_for_desktop = False
+        self.restart_timer.stop()
+        self.health_timer.stop()
+
+    def reset(self):
+        """
+        Forget crash history and playback position before a user-initiated launch.
+        """
+        self.crash_times.clear()
+        self.failure_started = None
+        self.position = None
+
+    def _wait_process(self, generation, process):
+        code = process.wait()
+        self.failure.emit(generation, f"MPV exited with code {code}")
+
+    def _wait_events(self, generation, process, listener):
+        while True:
+            try:
+                message = listener.events.get(timeout=1)
+            except queue.Empty:
+                if listener.disconnected.is_set():
+                    break
+                continue
+            if message.get("event") == "ipc-disconnected":
+                break
+        try:
+            # A disconnect caused by MPV exiting is reported by the process watcher
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.failure.emit(generation, "MPV IPC connection lost")
+
+    def _sample_position(self, generation, process, pipe_name):
+        # Remember where playback is so a restart can resume there
+        while generation == self.generation and process.poll() is None:
+            position = query_mpv_property(pipe_name, "time-pos")
+            if isinstance(position, (int, float)) and generation == self.generation:
+                self.position = position
+            time.sleep(self.POSITION_SAMPLE_INTERVAL)
+
+    def _on_failure(self, generation, reason):
+        if generation != self.generation:
+            return  # Stale launch or already handled by the other watcher
+        self.generation += 1
+        self.health_timer.stop()
+        if not is_looping and current_process and current_process.poll() == 0:
+            print("[INFO] Wallpaper playback finished")
+            return
+        print(f"[WARNING] Wallpaper failure detected: {reason}")
+        trace_instant("wallpaper_failure", reason=reason)
+        now = time.monotonic()
+        if self.failure_started is None:
+            self.failure_started = time.perf_counter()
+        self.crash_times.append(now)
+        while self.crash_times and now - self.crash_times[0] > self.CRASH_LOOP_WINDOW:
+            self.crash_times.popleft()
+        if len(self.crash_times) >= self.CRASH_LOOP_LIMIT:
+            print(f"[ERROR] Wallpaper failed {len(self.crash_times)} times in {self.CRASH_LOOP_WINDOW:.0f} seconds, giving up")
+            self.failure_started = None
+            self.gave_up.emit(reason)
+            return
+        delay = min(self.RESTART_BASE_DELAY_MS * 2 ** (len(self.crash_times) - 1), self.RESTART_MAX_DELAY_MS)
+        print(f"[INFO] Restarting wallpaper in {delay} ms")
+        self.restart_timer.start(delay)
+
+    def _restart(self):
+        if not self.video_path or not os.path.exists(self.video_path):
+            self.gave_up.emit("wallpaper file no longer exists")
+            return
+        should_mute = is_muted or not is_desktop_active()
+        print(f"[INFO] Restarting wallpaper {self.video_path} at {self.position or 0:.1f}s")
+        with trace_span("wallpaper_restart", attempt=len(self.crash_times)):
+            restarted = play_video_as_wallpaper(self.video_path, mute=should_mute, loop=is_looping, start=self.position, interactive=False)
+        if not restarted and wallpaper_hwnd is None:
+            self._wait_for_desktop("desktop window not available")
+            return
+        if not restarted:
+            self._on_failure(self.generation, "restart failed")
+            return
+        if "first_frame_ms" not in launch_metrics:
+            # Stalled or IPC-less launches have not drawn anything yet
+            self._on_failure(self.generation, "restarted wallpaper did not render a frame")
+            return
+        self.last_recovery_ms = (time.perf_counter() - self.failure_started) * 1000
+        self.failure_started = None
+        print(f"[INFO] Wallpaper recovered in {self.last_recovery_ms:.0f} ms")
+        trace_counter("wallpaper_recovery_ms", recovery=self.last_recovery_ms)
+        self.recovered.emit(self.last_recovery_ms)
+
+    def _wait_for_desktop(self, reason):
+        """
+        Pause restarts until Explorer recreates the desktop; this is not counted as an MPV crash.
+        """
+        self.generation += 1
+        self.restart_timer.stop()
+        if self.failure_started is None:
+            self.failure_started = time.perf_counter()
+        if not self.waiting_for_desktop:
+            print(f"[WARNING] {reason}, waiting for Explorer to recreate the desktop")
+            trace_instant("wallpaper_waiting_for_desktop", reason=reason)
+        self.waiting_for_desktop = True
+        self.health_timer.start(1000)
+
+    def _check_health(self):
+        """
+        Detect a recreated desktop window, restart once it is back and recover audio control.
+        """
+        global audio_control_enabled
+        if self.waiting_for_desktop:
+            if ctypes.windll.user32.FindWindowW("Progman", None):
+                self.waiting_for_desktop = False
+                self.health_timer.stop()
+                self._restart()
+            return
+        if wallpaper_hwnd and not ctypes.windll.user32.IsWindow(wallpaper_hwnd):
+            self._wait_for_desktop("desktop window was destroyed")
+            return
+        if not current_process or current_process.poll() is not None:
+            return
+        if not audio_control_enabled and mpv_socket and time.monotonic() >= self.audio_retry_at:
+            if check_pipe_availability(mpv_socket):
+                print("[INFO] MPV socket reachable again, audio control re-enabled")
+                audio_control_enabled = True
+                self.audio_retry_delay = 1.0
+            else:
+                self.audio_retry_delay = min(self.audio_retry_delay * 2, self.AUDIO_RETRY_MAX_DELAY)
+            self.audio_retry_at = time.monotonic() + self.audio_retry_delay
+
+LIBRARY_SORTS = {
+    "Name": "name",
+    "Recently used": "recent",
+    "Most used": "most_used",
+    "Size": "size"
+}
+LIBRARY_RANGE_FIELDS = ("width", "height", "duration", "size")
+LIBRARY_SAVE_EVERY = 500  # Probe results between index saves during a scan
+LIBRARY_QUERY_UNITS = {  # Unit multipliers per range field
+    "size": {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2, "g": 1024 ** 3, "gb": 1024 ** 3},
+    "duration": {"": 1, "s": 1, "m": 60, "min": 60, "h": 3600},
+    "height": {"": 1, "p": 1, "px": 1},
+    "width": {"": 1, "px": 1}
+}
+
+def parse_library_query(text):
+    """
+    Split search box text into fuzzy search words and filters.
+    Supported filters: codec:h264, audio:yes|no, res>=1080 (height), width>=1920, dur<60 (seconds, or 2m), size<200mb.
+    Range filters map to (low, high, low_inclusive, high_inclusive) tuples.
+    """
+    words = []
+    filters = {}
+    for token in text.split():
+        lowered = token.lower()
+        for op in (">=", "<=", ">", "<", ":"):
+            key, sep, value = lowered.partition(op)
+            if sep and key and value:
+                break
+        else:
+            words.append(lowered)
+            continue
+        if key == "codec" and op == ":":
+            filters["codec"] = value
+        elif key == "audio" and op == ":" and value in ("yes", "no", "true", "false", "1", "0"):
+            filters["has_audio"] = value in ("yes", "true", "1")
+        elif key in ("res", "height", "width", "dur", "duration", "size"):
+            field = {"res": "height", "dur": "duration"}.get(key, key)
+            number = value.rstrip("abcdefghijklmnopqrstuvwxyz")
+            unit = value[len(number):]
+            try:
+                amount = float(number) * LIBRARY_QUERY_UNITS[field][unit]
+            except (KeyError, ValueError):
+                words.append(lowered)
+                continue
+            low, high, low_inclusive, high_inclusive = filters.get(field, (None, None, True, True))
+            if op in (">=", ">"):
+                low, low_inclusive = amount, op == ">="
+            elif op in ("<=", "<"):
+                high, high_inclusive = amount, op == "<="
+            else:
+                low = high = amount
+                low_inclusive = high_inclusive = True
+            filters[field] = (low, high, low_inclusive, high_inclusive)
+        else:
+            words.append(lowered)
+    return " ".join(words), filters
+
+def fuzzy_score(words, name):
+    """
+    Score how well every search word matches the lowercase name as a substring or subsequence.
+    Lower is better; None means no match.
+    """
+    score = 0.0
+    for word in words:
+        index = name.find(word)
+        if index >= 0:
+            score += index / 100
+            continue
+        position = -1
+        first = None
+        for char in word:
+            position = name.find(char, position + 1)
+            if position < 0:
+                return None
+            if first is None:
+                first = position
+        # Penalize the gaps between matched characters
+        score += 1 + (position - first + 1 - len(word))
+    return score
+
+class WallpaperLibrary(QObject):
+    """
+    Persisted index of wallpaper files and their metadata with precomputed query indexes.
+    """
+    metadata_ready = Signal(str, object)  # (file name, probed metadata), emitted from the probe thread
+    updated = Signal()
+
+    def __init__(self, index_file, parent=None):
+        super().__init__(parent)
+        self.index_file = index_file
+        self.entries = {}
+        self.dirty = False
+        self._names_stale = True  # Character index over file names
+        self._indexes_stale = True  # Metadata indexes
+        self._orders = {}  # Cached sort orders, dropped when their keys change
+        self._probe_queue = queue.Queue()
+        self._probe_queued = set()  # Names waiting in the probe queue
+        self._probe_failed = set()  # Names ffprobe could not read this session, retried on next launch
+        self._probe_thread = None
+        self._unsaved_probes = 0
+        self.metadata_ready.connect(self._apply_metadata)
+        self.load()
+
+    def load(self):
+        """
+        Load the library index from disk.
+        """
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("entries", {})
+            print(f"[INFO] Loaded library index with {len(self.entries)} entries")
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Failed to load library index {self.index_file}: {e}")
+            self.entries = {}
+        self._names_stale = True
+        self._indexes_stale = True
+
+    def save(self):
+        """
+        Write the library index to disk if it changed.
+        """
+        if not self.dirty:
+            return
+        temp_file = self.index_file + ".tmp"
+        try:
+            with trace_span("library_save", entries=len(self.entries)):
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump({"version": 1, "entries": self.entries}, f)
+                os.replace(temp_file, self.index_file)
+            self.dirty = False
+            self._unsaved_probes = 0
+        except OSError as e:
+            print(f"[ERROR] Failed to save library index {self.index_file}: {e}")
+
+    @traced("library_sync")
+    def sync(self, video_dir):
+        """
+        Match the index to the files in video_dir and queue new or changed files for probing.
+        """
+        seen = set()
+        for item in os.scandir(video_dir):
+            if not item.is_file() or not item.name.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            stat = item.stat()
+            seen.add(item.name)
+            entry = self.entries.get(item.name)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            self.entries[item.name] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "width": None,
+                "height": None,
+                "duration": None,
+                "codec": None,
+                "has_audio": None,
+                "probed": False,
+                "last_used": entry["last_used"] if entry else 0,
+                "use_count": entry["use_count"] if entry else 0
+            }
+            self._probe_failed.discard(item.name)  # A replaced file deserves a fresh probe
+            self.dirty = True
+            self._names_stale = self._names_stale or entry is None
+            self._indexes_stale = True
+        for name in set(self.entries) - seen:
+            del self.entries[name]
+            self.dirty = True
+            self._names_stale = True
+            self._indexes_stale = True
+        unprobed = [name for name, entry in self.entries.items() if not entry["probed"] and name not in self._probe_queued and name not in self._probe_failed]
+        for name in unprobed:
+            self._probe_queued.add(name)
+            self._probe_queue.put(os.path.join(video_dir, name))
+        if unprobed and self._probe_thread is None:
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="library-probe", daemon=True)
+            self._probe_thread.start()
+        print(f"[INFO] Library synced: {len(self.entries)} videos, {len(unprobed)} queued for probing")
+
+    def _probe_loop(self):
+        # Long-lived so paths queued by a later sync are never left without a reader
+        while True:
+            video_path = self._probe_queue.get()
+            self.metadata_ready.emit(os.path.basename(video_path), probe_video(video_path))
+
+    def _apply_metadata(self, name, metadata):
+        self._probe_queued.discard(name)
+        entry = self.entries.get(name)
+        if entry is None:
+            return
+        if metadata is None:
+            # Leave unprobed so the file is probed again once ffprobe works
+            self._probe_failed.add(name)
+            return
+        # Patch the built indexes for this one entry instead of rebuilding them
+        indexed = not self._indexes_stale
+        if indexed:
+            self._unindex_metadata(name, entry)
+        entry.update(metadata)
+        entry["probed"] = True
+        if indexed:
+            self._index_metadata(name, entry)
+        self.dirty = True
+        self._unsaved_probes += 1
+        if self._unsaved_probes >= LIBRARY_SAVE_EVERY or not self._probe_queued:
+            self.save()
+        self.updated.emit()
+
+    def _index_metadata(self, name, entry):
+        if entry["codec"]:
+            self._by_codec.setdefault(entry["codec"], set()).add(name)
+        if entry["has_audio"] is True:
+            self._with_audio.add(name)
+        elif entry["has_audio"] is False:
+            self._without_audio.add(name)
+        for field in LIBRARY_RANGE_FIELDS:
+            if entry[field] is not None:
+                values, names = self._ranges[field]
+                index = bisect.bisect_right(values, entry[field])
+                values.insert(index, entry[field])
+                names.insert(index, name)
+
+    def _unindex_metadata(self, name, entry):
+        if entry["codec"]:
+            self._by_codec.get(entry["codec"], set()).discard(name)
+        self._with_audio.discard(name)
+        self._without_audio.discard(name)
+        for field in LIBRARY_RANGE_FIELDS:
+            if entry[field] is not None:
+                values, names = self._ranges[field]
+                index = bisect.bisect_left(values, entry[field])
+                while index < len(names) and names[index] != name:
+                    index += 1
+                if index < len(names):
+                    del values[index]
+                    del names[index]
+
+    def record_use(self, name):
+        """
+        Record that the named video was set as wallpaper.
+        """
+        entry = self.entries.get(name)
+        if entry:
+            entry["last_used"] = time.time()
+            entry["use_count"] += 1
+            self.dirty = True
+            self._orders.pop("recent", None)
+            self._orders.pop("most_used", None)
+
+    def get(self, name):
+        """
+        Return the index entry for a file name, or None.
+        """
+        return self.entries.get(name)
+
+    def _ensure_indexes(self):
+        if self._names_stale:
+            with trace_span("library_name_index_build", entries=len(self.entries)):
+                self._by_char = {}
+                self._lowered = {}
+                for name in self.entries:
+                    lowered = name.lower()
+                    self._lowered[name] = lowered
+                    for char in set(lowered):
+                        self._by_char.setdefault(char, set()).add(name)
+            self._names_stale = False
+        if not self._indexes_stale:
+            return
+        with trace_span("library_index_build", entries=len(self.entries)):
+            self._by_codec = {}
+            self._with_audio = set()
+            self._without_audio = set()
+            for name, entry in self.entries.items():
+                if entry["codec"]:
+                    self._by_codec.setdefault(entry["codec"], set()).add(name)
+                if entry["has_audio"] is True:
+                    self._with_audio.add(name)
+                elif entry["has_audio"] is False:
+                    self._without_audio.add(name)
+            # Sorted (value, name) columns for range filters via bisect
+            self._ranges = {}
+            for field in LIBRARY_RANGE_FIELDS:
+                column = sorted((entry[field], name) for name, entry in self.entries.items() if entry[field] is not None)
+                self._ranges[field] = ([value for value, _ in column], [name for _, name in column])
+            self._orders = {}
+        self._indexes_stale = False
+
+    def _order(self, sort):
+        if sort not in self._orders:
+            if sort == "name":
+                self._orders[sort] = sorted(self.entries, key=str.lower)
+            else:
+                field = {"recent": "last_used", "most_used": "use_count", "size": "size"}[sort]
+                self._orders[sort] = sorted(self.entries, key=lambda name: -self.entries[name][field])
+        return self._orders[sort]
+
+    def query(self, text="", sort=None, codec=None, has_audio=None, **ranges):
+        """
+        Return file names matching the fuzzy search text and filters.
+        ranges maps width, height, duration or size to a (low, high, low_inclusive, high_inclusive) tuple;
+        a None bound leaves that side open.
+        Results are ordered by sort ("name", "recent", "most_used", "size"), or by relevance when searching.
+        """
+        self._ensure_indexes()
+        with trace_span("library_query", text=text, sort=sort):
+            candidates = None
+
+            def narrow(subset):
+                return set(subset) if candidates is None else candidates.intersection(subset)
+
+            words = text.lower().split()
+            if words:
+                # Every character must occur in the name for a subsequence match
+                for char in sorted(set("".join(words)), key=lambda c: len(self._by_char.get(c, ()))):
+                    candidates = narrow(self._by_char.get(char, set()))
+                    if not candidates:
+                        return []
+            if codec:
+                candidates = narrow(self._by_codec.get(codec.lower(), set()))
+            if has_audio is not None:
+                candidates = narrow(self._with_audio if has_audio else self._without_audio)
+            for field, (low, high, low_inclusive, high_inclusive) in ranges.items():
+                values, names = self._ranges[field]
+                if low is None:
+                    start = 0
+                else:
+                    start = bisect.bisect_left(values, low) if low_inclusive else bisect.bisect_right(values, low)
+                if high is None:
+                    end = len(values)
+                else:
+                    end = bisect.bisect_right(values, high) if high_inclusive else bisect.bisect_left(values, high)
+                candidates = narrow(names[start:end])
+
+            if words and not sort:
+                scored = []
+                for name in candidates:
+                    score = fuzzy_score(words, self._lowered[name])
+                    if score is not None:
+                        scored.append((score, self._lowered[name], name))
+                scored.sort()
+                return [name for _, _, name in scored]
+            if words:
+                candidates = {name for name in candidates if fuzzy_score(words, self._lowered[name]) is not None}
+            order = self._order(sort or "name")
+            if candidates is None:
+                return list(order)
+            return [name for name in order if name in candidates]
 
 class LiveWallpaperApp(QWidget):
     def __init__(self):
@@ -455,6 +1555,14 @@ class LiveWallpaperApp(QWidget):
                 width: 16px;
                 height: 16px;
             }
+            QLineEdit, QComboBox {
+                background-color: #252537;
+                border: 1px solid #3b3b4f;
+                color: #d4d4d4;
+                font-size: 13px;
+                padding: 4px;
+                border-radius: 4px;
+            }
         """)
 
         layout = QVBoxLayout()
@@ -475,11 +1583,40 @@ class LiveWallpaperApp(QWidget):
         self.status_bar.showMessage("Ready")
         layout.addWidget(self.status_bar)
 
+        global wallpaper_library
+        wallpaper_library = WallpaperLibrary(LIBRARY_INDEX_FILE, self)
+        wallpaper_library.updated.connect(self.schedule_library_update)
+
+        search_layout = QHBoxLayout()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search (e.g. beach codec:h264 audio:yes res>=1080 dur<60 size<200mb)")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(lambda: self.filter_timer.start(150))
+        search_layout.addWidget(self.search_box)
+        self.sort_box = QComboBox()
+        self.sort_box.addItems(list(LIBRARY_SORTS))
+        self.sort_box.currentIndexChanged.connect(self.apply_filter)
+        search_layout.addWidget(self.sort_box)
+        layout.addLayout(search_layout)
+
+        # Debounce typing and background probe results
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.library_save_timer = QTimer(self)
+        self.library_save_timer.setSingleShot(True)
+        self.library_save_timer.timeout.connect(wallpaper_library.save)
+
         self.listbox = QListWidget()
+        self.listbox.setUniformItemSizes(True)
         self.listbox.currentItemChanged.connect(self.show_preview)
         layout.addWidget(self.listbox)
 
-        self.preview_widget = QWidget()
+        global preview_cache
+        preview_cache = PreviewCache(self)
+        preview_cache.ready.connect(self.on_preview_ready)
+
+        self.preview_widget = PreviewPlayer()
         self.preview_widget.setFixedHeight(150)
         self.preview_widget.setStyleSheet("background-color: #252537; border: 1px solid #3b3b4f; border-radius: 4px;")
         layout.addWidget(self.preview_widget)
@@ -515,6 +1652,12 @@ class LiveWallpaperApp(QWidget):
         layout.addWidget(self.footer_label)
 
         self.setLayout(layout)
+
+        global wallpaper_supervisor
+        wallpaper_supervisor = WallpaperSupervisor(self)
+        wallpaper_supervisor.recovered.connect(self.on_wallpaper_recovered)
+        wallpaper_supervisor.gave_up.connect(self.on_wallpaper_gave_up)
+
         self.refresh_list()
 
         self.load_settings()
@@ -526,11 +1669,20 @@ class LiveWallpaperApp(QWidget):
         menu = QMenu()
         open_action = QAction("Open", self)
         open_action.triggered.connect(self.show_normal)
+        self.trace_action = QAction("Enable Tracing", self)
+        self.trace_action.setCheckable(True)
+        self.trace_action.setChecked(trace_enabled)
+        self.trace_action.toggled.connect(self.toggle_tracing)
+        dump_trace_action = QAction("Dump Trace", self)
+        dump_trace_action.triggered.connect(self.save_trace)
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.exit_app)
 
         menu.addAction(open_action)
         menu.addSeparator()
+        menu.addAction(self.trace_action)
+        menu.addAction(dump_trace_action)
+        menu.addSeparator()
         menu.addAction(exit_action)
 
         self.tray_icon.setContextMenu(menu)
@@ -576,13 +1728,60 @@ class LiveWallpaperApp(QWidget):
         """
         Refresh the list of available wallpapers in the listbox.
         """
-        self.listbox.clear()
-        for file in os.listdir(VIDEO_DIR):
-            if file.lower().endswith(('.mp4', '.mkv', '.avi', '.mov', '.webm')):
-                self.listbox.addItem(file)
+        with trace_span("refresh_list"):
+            wallpaper_library.sync(VIDEO_DIR)
+            self.library_save_timer.start(2000)
+            self.apply_filter()
+            # Recently used wallpapers get their previews first
+            preview_cache.prefetch(os.path.join(VIDEO_DIR, name) for name in wallpaper_library.query(sort="recent"))
         print("[INFO] Refreshed video list")
         self.status_bar.showMessage("Ready" if not current_process else f"Playing: {self.listbox.currentItem().text() if self.listbox.currentItem() else 'Unknown'}")
-        stop_video(is_preview=True)
+
+    def apply_filter(self):
+        """
+        Show the wallpapers matching the search box and sort order, keeping the selection if it still matches.
+        """
+        text, filters = parse_library_query(self.search_box.text())
+        sort = LIBRARY_SORTS[self.sort_box.currentText()]
+        names = wallpaper_library.query(text, sort=None if text and sort == "name" else sort, **filters)
+        selected = self.listbox.currentItem().text() if self.listbox.currentItem() else None
+        # Rebuild without signals so a surviving selection keeps its preview running
+        self.listbox.blockSignals(True)
+        self.listbox.clear()
+        self.listbox.addItems(names)
+        if selected in names:
+            self.listbox.setCurrentRow(names.index(selected))
+        self.listbox.blockSignals(False)
+        if selected and selected not in names:
+            self.show_preview(None, None)
+
+    def schedule_library_update(self):
+        """
+        Refresh the filtered list shortly after new metadata arrives.
+        """
+        _, filters = parse_library_query(self.search_box.text())
+        # Without metadata filters new probe results cannot change which names are shown
+        if filters and not self.filter_timer.isActive():
+            self.filter_timer.start(500)
+
+    def describe_video(self, name):
+        """
+        Summarize indexed metadata for the status bar.
+        """
+        entry = wallpaper_library.get(name)
+        if not entry:
+            return name
+        details = []
+        if entry["width"] and entry["height"]:
+            details.append(f"{entry['width']}x{entry['height']}")
+        if entry["duration"]:
+            details.append(f"{int(entry['duration'] // 60)}:{int(entry['duration'] % 60):02d}")
+        if entry["codec"]:
+            details.append(entry["codec"])
+        if entry["has_audio"] is not None:
+            details.append("audio" if entry["has_audio"] else "no audio")
+        details.append(f"{entry['size'] / 1024 ** 2:.1f} MB")
+        return f"{name} ({', '.join(details)})"
 
     def add_video(self):
         """
@@ -607,11 +1806,32 @@ class LiveWallpaperApp(QWidget):
         stop_video(is_preview=True)
         if current and not self.isHidden():
             video_path = os.path.join(VIDEO_DIR, current.text())
-            self.status_bar.showMessage(f"Selected: {current.text()}")
-            play_preview_video(video_path, self.preview_widget, mute=True, loop=self.loop_checkbox.isChecked())
+            self.status_bar.showMessage(f"Selected: {self.describe_video(current.text())}")
+            play_preview_video(video_path, self.preview_widget, loop=self.loop_checkbox.isChecked())
+            # Prefetch neighbours so moving through the list shows motion immediately
+            row = self.listbox.row(current)
+            for neighbour in (row + 1, row - 1):
+                item = self.listbox.item(neighbour)
+                if item:
+                    preview_cache.request(os.path.join(VIDEO_DIR, item.text()), priority=1)
         else:
+            self.preview_widget.stop()
             self.status_bar.showMessage("Ready")
 
+    def on_preview_ready(self, video_path, sheet_path):
+        """
+        Start the preview once the sheet for the selected video has been generated.
+        """
+        current = self.listbox.currentItem()
+        if not current or self.isHidden() or os.path.join(VIDEO_DIR, current.text()) != video_path:
+            return
+        if sheet_path and preview_player is self.preview_widget and self.preview_widget.sheet_path == sheet_path:
+            return  # Already animating this sheet, do not restart it
+        if sheet_path:
+            self.show_preview(current, None)
+        else:
+            self.preview_widget.show_message("Preview unavailable")
+
     def set_wallpaper(self):
         """
         Set the selected video as the desktop wallpaper.
@@ -622,10 +1842,18 @@ class LiveWallpaperApp(QWidget):
             video_path = os.path.join(VIDEO_DIR, selected.text())
             print(f"[INFO] Setting wallpaper: {video_path}")
             should_mute = is_muted or not is_desktop_active()
+            wallpaper_supervisor.reset()
             if play_video_as_wallpaper(video_path, mute=should_mute, loop=self.loop_checkbox.isChecked()):
-                self.status_bar.showMessage(f"Playing: {selected.text()}")
+                if "first_frame_ms" in launch_metrics:
+                    self.status_bar.showMessage(f"Playing: {selected.text()} (first frame in {launch_metrics['first_frame_ms']:.0f} ms)")
+                else:
+                    self.status_bar.showMessage(f"Playing: {selected.text()}")
                 QMessageBox.information(self, "Success", f"Set {selected.text()} as wallpaper")
                 self.save_settings()
+                wallpaper_library.record_use(selected.text())
+                self.library_save_timer.start(2000)
+                if LIBRARY_SORTS[self.sort_box.currentText()] in ("recent", "most_used"):
+                    self.apply_filter()
             else:
                 self.status_bar.showMessage("Error setting wallpaper")
                 last_mute_state = None
@@ -646,9 +1874,27 @@ class LiveWallpaperApp(QWidget):
         pending_mute = None
         audio_control_enabled = True
 
+    def on_wallpaper_recovered(self, recovery_ms):
+        """
+        Update status after the supervisor restarted a crashed wallpaper.
+        """
+        name = os.path.basename(wallpaper_supervisor.video_path)
+        self.status_bar.showMessage(f"Playing: {name} (recovered in {recovery_ms:.0f} ms)")
+
+    def on_wallpaper_gave_up(self, reason):
+        """
+        Stop the wallpaper once the supervisor stops restarting it.
+        """
+        global last_mute_state, pending_mute
+        stop_video(is_preview=False)
+        last_mute_state = None
+        pending_mute = None
+        self.status_bar.showMessage("Wallpaper stopped after repeated crashes")
+        QMessageBox.warning(self, "Warning", f"Wallpaper keeps crashing and was stopped ({reason}). Check the MPV log or try a different video.")
+
     def toggle_mute(self):
         """
-        Toggle mute state for the current wallpaper and preview.
+        Toggle mute state for the current wallpaper.
         """
         global is_muted, last_mute_state, pending_mute, audio_control_enabled
         is_muted = self.mute_checkbox.isChecked()
@@ -664,8 +1910,6 @@ class LiveWallpaperApp(QWidget):
                 else:
                     pending_mute = should_mute
                     print(f"[WARNING] Failed to toggle audio, will retry in next check")
-        if preview_process:
-            self.show_preview(self.listbox.currentItem(), None)
 
     def toggle_loop(self):
         """
@@ -680,7 +1924,7 @@ class LiveWallpaperApp(QWidget):
             if selected:
                 video_path = os.path.join(VIDEO_DIR, selected.text())
                 self.set_wallpaper()
-        if preview_process:
+        if preview_player:
             self.show_preview(self.listbox.currentItem(), None)
 
     def check_desktop_state(self):
@@ -708,6 +1952,7 @@ class LiveWallpaperApp(QWidget):
         global last_mute_state, pending_mute, audio_control_enabled
         self.hide()
         event.ignore()
+        stop_video(is_preview=True)
         print("[INFO] Window minimized to tray")
         if current_process and audio_control_enabled:
             should_mute = is_muted or not is_desktop_active()
@@ -736,6 +1981,8 @@ class LiveWallpaperApp(QWidget):
         self.raise_()
         self.activateWindow()
         print("[INFO] Window restored from tray")
+        if self.listbox.currentItem():
+            self.show_preview(self.listbox.currentItem(), None)
         if current_process and audio_control_enabled:
             should_mute = is_muted or not is_desktop_active()
             if should_mute != last_mute_state:
@@ -748,6 +1995,29 @@ class LiveWallpaperApp(QWidget):
                     print(f"[WARNING] Failed to toggle audio on restore, will retry in next check")
             self.status_bar.showMessage(f"Playing: {self.listbox.currentItem().text() if self.listbox.currentItem() else 'Unknown'}")
 
+    def toggle_tracing(self, enabled):
+        """
+        Enable or disable span tracing from the tray menu.
+        """
+        global trace_enabled
+        trace_enabled = enabled
+        print(f"[INFO] Tracing {'enabled' if enabled else 'disabled'}")
+
+    def save_trace(self):
+        """
+        Write the recorded trace to disk from the tray menu.
+        """
+        if not trace_events:
+            QMessageBox.information(self, "Trace", "No trace events recorded. Enable tracing first.")
+            return
+        try:
+            path = dump_trace()
+        except OSError as e:
+            print(f"[ERROR] Failed to write trace: {e}")
+            QMessageBox.warning(self, "Warning", f"Failed to write trace: {e}")
+            return
+        QMessageBox.information(self, "Trace", f"Trace written to {path}. Open it in chrome://tracing or ui.perfetto.dev.")
+
     def exit_app(self):
         """
         Stop the wallpaper and preview, then exit the application.
@@ -757,14 +2027,28 @@ class LiveWallpaperApp(QWidget):
         stop_video(is_preview=True)
         self.tray_icon.hide()
         self.save_settings()
+        wallpaper_library.save()
         last_mute_state = None
         pending_mute = None
         audio_control_enabled = True
+        if trace_enabled and trace_events:
+            try:
+                dump_trace()
+            except OSError as e:
+                print(f"[ERROR] Failed to write trace: {e}")
         QApplication.quit()
         print("[INFO] Application exited")
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Live Wallpaper by Team Emogi")
+    parser.add_argument("--trace", nargs="?", const=trace_file, metavar="PATH",
+                        help="Record launch and IPC spans and write a Chrome trace JSON on exit")
+    args, qt_args = parser.parse_known_args()
+    if args.trace:
+        trace_enabled = True
+        trace_file = args.trace
+        print(f"[INFO] Tracing enabled, writing to {trace_file} on exit")
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setFont(QFont("Roboto", 10))
     window = LiveWallpaperApp()
     window.show()